@@ -1,14 +1,25 @@
-import os, json, sqlite3, secrets
-from datetime import datetime
+import os, json, sqlite3, secrets, threading, multiprocessing, time as _time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from io import BytesIO
+from urllib.parse import urlencode
 from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, abort
-from flask_mail import Mail
+from flask_mail import Mail, Message
 import razorpay
 
 from config import Dev
 from services.storage import save_id_proof
-from services.pdf_ticket import generate_ticket_pdf
 from services.emailer import send_ticket
 from services.gsheet import append_booking
+from services.search import init_search_index, search_bookings
+from services.holds import (init_holds, place_hold, claim_offer, join_waitlist, offer_free_seats,
+                            sweep_expired, save_draft, load_draft, confirm_booking, record_payment_issue)
+from services.reissue import init_reissue, create_job, get_job, claim_job, run_job
+from services.archive import (init_archive, archive_bookings, find_archived, ticket_member,
+                              load_archived_booking, read_archived_file)
+from services.boarding import (init_boarding, load_signing_key, generate_signing_key, public_key_text,
+                               ticket_payload, render_ticket, build_manifest, record_checkins)
+from services.blobstore import make_store
 
 app = Flask(__name__, instance_relative_config=True)
 app.config.from_object(Dev)
@@ -17,6 +28,14 @@ os.makedirs(app.instance_path, exist_ok=True)
 DB_PATH = os.path.join(app.instance_path, 'boating.db')
 SLOTS_PATH = os.path.join('data', 'slots.json')
 
+# ticket PDFs and ID proofs: local folders by default, or an S3-compatible bucket
+CACHE_DIR = os.path.join(app.instance_path, 'cache')
+ticket_store = make_store(app.config, 'tickets', os.path.join(app.instance_path, 'tickets'), CACHE_DIR)
+# ID proofs are personal data, so neither they nor the archive zips that bundle them
+# are kept in the shared local read cache; reads fetch a private copy and drop it
+id_store = make_store(app.config, 'id_proofs', app.config['UPLOAD_FOLDER'], CACHE_DIR, cache=False)
+archive_store = make_store(app.config, 'archive', os.path.join(app.instance_path, 'archive'), CACHE_DIR, cache=False)
+
 mail = Mail(app)
 
 # Initialize Razorpay client with fallback for testing
@@ -32,10 +51,29 @@ if app.config.get('RAZORPAY_KEY_ID') and app.config.get('RAZORPAY_KEY_SECRET'):
 else:
     print("🔧 No Razorpay API keys found - using mock client for testing")
 
+def verify_signature(order_id, payment_id, signature):
+    rzp.utility.verify_payment_signature({
+        'razorpay_order_id': order_id,
+        'razorpay_payment_id': payment_id,
+        'razorpay_signature': signature
+    })
+
+# Ed25519 key for ticket QR codes and boarding manifests; without it tickets carry no QR
+boarding_key = None
+if app.config.get('BOARDING_KEY'):
+    boarding_key = load_signing_key(app.config['BOARDING_KEY'])
+else:
+    print("⚠️  BOARDING_KEY not set - tickets are issued without boarding QR codes (flask --app app boarding-key)")
+
 # --- db setup ---
 
 def init_db():
     with sqlite3.connect(DB_PATH) as con:
+        # lets the archive job hand back freed pages a few at a time instead of a locking VACUUM;
+        # must precede WAL and only applies to a new file (an existing one needs a one-off VACUUM)
+        con.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        # WAL lets seat-hold writes from several workers commit without blocking readers
+        con.execute('PRAGMA journal_mode=WAL')
         cur = con.cursor()
         cur.execute('''CREATE TABLE IF NOT EXISTS bookings (
             booking_id TEXT PRIMARY KEY,
@@ -47,6 +85,11 @@ def init_db():
             created_at TEXT
         )''')
         con.commit()
+        init_search_index(con)
+        init_holds(con)
+        init_reissue(con)
+        init_archive(con)
+        init_boarding(con)
 
 init_db()
 
@@ -63,6 +106,105 @@ def write_slots(data):
     with open(SLOTS_PATH, 'w') as f:
         json.dump(data, f, indent=2)
 
+def notify_waitlist_offers(offers):
+    for offer in offers:
+        link = f"{app.config['BASE_URL']}/customer?" + urlencode({
+            'date': offer['date'], 'time': offer['time'], 'route': offer['route'],
+            'persons': offer['persons'], 'hold': offer['token']})
+        expires = datetime.fromtimestamp(offer['expires_at']).strftime('%Y-%m-%d %H:%M')
+        try:
+            mail.send(Message(subject=f"Seats available: {offer['date']} {offer['time']}",
+                              recipients=[offer['email']],
+                              body=f"Dear {offer['name']},\n\n{offer['persons']} seat(s) on {offer['route']} "
+                                   f"({offer['date']} {offer['time']}) are being held for you until {expires}.\n\n"
+                                   f"Complete your booking here: {link}\n\nThank you!"))
+            print(f"✅ Waitlist offer sent to {offer['email']}")
+        except Exception as e:
+            print(f"⚠️  Waitlist offer email failed: {e}")
+
+def sweep_holds():
+    """Expire abandoned checkouts and waitlist offers, then offer the freed seats.
+
+    Drafts stay behind (until DRAFT_RETENTION_SECONDS) so a late payment still becomes a booking.
+    """
+    with sqlite3.connect(DB_PATH) as con:
+        expired, offers = sweep_expired(con, app.config['SLOT_CAPACITY'], app.config['WAITLIST_OFFER_SECONDS'],
+                                        app.config['DRAFT_RETENTION_SECONDS'])
+    if expired or offers:
+        print(f"🧹 Released {len(expired)} expired checkout(s), made {len(offers)} waitlist offer(s)")
+    if offers:
+        with app.app_context():
+            notify_waitlist_offers(offers)
+
+def start_hold_sweeper():
+    interval = app.config['HOLD_SWEEP_INTERVAL']
+    # re-issue render processes re-import this module under the dev server; they must not sweep
+    if not interval or multiprocessing.parent_process():
+        return
+    def loop():
+        while True:
+            _time.sleep(interval)
+            try:
+                sweep_holds()
+            except Exception as e:
+                print(f"⚠️  Hold sweep failed: {e}")
+    threading.Thread(target=loop, name='hold-sweeper', daemon=True).start()
+
+start_hold_sweeper()
+
+def party_size(value):
+    """Seats requested, or None unless it is a whole number from 1 to SLOT_CAPACITY."""
+    try:
+        persons = int(value)
+    except (TypeError, ValueError):
+        return None
+    return persons if 1 <= persons <= app.config['SLOT_CAPACITY'] else None
+
+def ticket_data(booking):
+    data = {k: booking[k] for k in ('booking_id', 'date', 'time', 'route', 'persons', 'children_under3',
+                                    'name', 'phone', 'email', 'amount', 'payment_id')}
+    # signed payload for the boarding QR, checked offline against the departure manifest
+    data['qr_payload'] = ticket_payload(boarding_key, data) if boarding_key else None
+    return data
+
+@contextmanager
+def mail_connection():
+    # each pooled mailer thread holds one SMTP session for the whole batch
+    with app.app_context(), mail.connect() as conn:
+        yield conn
+
+def start_reissue_job(job_id):
+    """Run (or resume) a re-issue job in the background; no-op if any worker is already running it."""
+    if not claim_job(DB_PATH, job_id):
+        return False
+    with sqlite3.connect(DB_PATH) as con:
+        job = get_job(con, job_id)
+
+    def make_message(booking, pdf_path):
+        if job['new_date'] or job['new_time']:
+            change = (f"Your trip on {job['date']} {job['time']} has been moved to "
+                      f"{booking['date']} {booking['time']}. Your updated ticket is attached.")
+        else:
+            change = f"There is a change to your trip on {job['date']} {job['time']}."
+        msg = Message(subject=f"Schedule change: Boat Ticket {booking['booking_id']}",
+                      recipients=[booking['email']],
+                      body=f"Dear {booking['name']},\n\n{change}\n\n{job['message'] or ''}\n\n"
+                           f"Booking ID: {booking['booking_id']}\nRoute: {booking['route']}\n\nThank you!")
+        with open(pdf_path, 'rb') as f:
+            msg.attach(f"{booking['booking_id']}.pdf", 'application/pdf', f.read())
+        return msg
+
+    def run():
+        try:
+            run_job(DB_PATH, job_id, ticket_store, ticket_data,
+                    mail_connection, make_message, app.config['REISSUE_PROCESSES'], app.config['MAIL_POOL_SIZE'])
+            print(f"✅ Re-issue job {job_id} finished")
+        except Exception as e:
+            print(f"❌ Re-issue job {job_id} failed: {e}")
+
+    threading.Thread(target=run, name=f'reissue-{job_id}', daemon=True).start()
+    return True
+
 # --- routes ---
 
 @app.get('/')
@@ -84,32 +226,57 @@ def customer_info():
     persons = int(request.args.get('persons', 1))
     children = int(request.args.get('children_under3', 0))
     route = request.args.get('route')
+    hold_token = request.args.get('hold')
     if not all([date, time, route]):
         return redirect(url_for('index'))
-    return render_template('customer.html', date=date, time=time, persons=persons, children_under3=children, route=route)
+    return render_template('customer.html', date=date, time=time, persons=persons, children_under3=children, route=route,
+                           hold_token=hold_token)
 
 @app.post('/pay')
 def start_payment():
-    global rzp  # Declare rzp as global
     form = request.form
     files = request.files
 
-    # Save ID proof securely
-    id_file = files.get('id_file')
-    try:
-        id_path = save_id_proof(app.config['UPLOAD_FOLDER'], id_file)
-    except Exception as e:
-        return f"Upload error: {e}", 400
-
     # Compute amount (e.g., ₹500 per person)
-    persons = int(form['persons'])
-    children = int(form.get('children_under3', 0) or 0)
+    persons = party_size(form.get('persons'))
+    if persons is None:
+        return f"Persons must be a whole number from 1 to {app.config['SLOT_CAPACITY']}", 400
+    try:
+        children = int(form.get('children_under3', 0) or 0)
+    except ValueError:
+        children = -1
+    if children < 0:
+        return "Children under 3 must be a whole number", 400
     PRICE_PER_PERSON = 500  # INR
     amount = (persons * PRICE_PER_PERSON) * 100  # in paise; children under 3 free
 
     # Create a booking token (pre-payment)
     booking_token = secrets.token_urlsafe(16)
 
+    # Save ID proof securely, before any seats are taken: a failed upload must not spend a waitlist offer
+    id_file = files.get('id_file')
+    try:
+        # validated and written to the store's staging area, then moved (local) or streamed in parts (S3)
+        staged = save_id_proof(id_store.staging_dir, id_file)
+        id_key = os.path.basename(staged)
+        id_store.put_file(id_key, staged)
+        id_path = id_store.location(id_key)
+    except Exception as e:
+        return f"Upload error: {e}", 400
+
+    # Hold seats for the checkout; a waitlist offer token claims its reserved seats instead
+    hold_token = form.get('hold_token') or request.args.get('hold')
+    ttl = app.config['CHECKOUT_HOLD_SECONDS']
+    with sqlite3.connect(DB_PATH) as con:
+        if hold_token:
+            if not claim_offer(con, hold_token, booking_token, form['date'], form['time'], form['route'], persons, ttl):
+                id_store.delete(id_key)
+                return "This waitlist offer has expired or does not match the selected trip", 409
+        elif not place_hold(con, booking_token, form['date'], form['time'], form['route'], persons,
+                            app.config['SLOT_CAPACITY'], ttl):
+            id_store.delete(id_key)
+            return "Sorry, this departure is sold out. You can join the waitlist to be offered released seats.", 409
+
     # Create Razorpay order
     current_rzp = rzp  # Use local variable to avoid global modification issues
     if current_rzp:
@@ -124,7 +291,7 @@ def start_payment():
             print(f"❌ Razorpay order creation failed: {e}")
             print("🔧 Falling back to test mode")
             current_rzp = None
-    
+
     if not current_rzp:
         # Mock order for testing
         order = {
@@ -134,15 +301,15 @@ def start_payment():
         }
         print(f"🧪 Test order created: {order['id']}")
 
-    # temp store booking draft in server-side session-like cache (sqlite not needed yet)
-    app.config.setdefault('DRAFTS', {})
-    app.config['DRAFTS'][booking_token] = {
-        'date': form['date'], 'time': form['time'], 'route': form['route'],
-        'persons': persons, 'children_under3': children,
-        'name': form['name'], 'phone': form['phone'], 'email': form['email'], 'address': form['address'],
-        'id_type': form['id_type'], 'id_path': id_path,
-        'amount': amount, 'order_id': order['id']
-    }
+    # keep the booking draft in SQLite so any worker can complete the payment, even after the hold lapses
+    with sqlite3.connect(DB_PATH) as con:
+        save_draft(con, booking_token, {
+            'date': form['date'], 'time': form['time'], 'route': form['route'],
+            'persons': persons, 'children_under3': children,
+            'name': form['name'], 'phone': form['phone'], 'email': form['email'], 'address': form['address'],
+            'id_type': form['id_type'], 'id_path': id_path,
+            'amount': amount, 'order_id': order['id']
+        })
 
     return render_template('pay.html',
         key_id=app.config['RAZORPAY_KEY_ID'],
@@ -162,29 +329,23 @@ def verify_payment():
     print(f"   Order ID: {order_id}")
     print(f"   Payment ID: {payment_id}")
     print(f"   Token: {token}")
-    print(f"   Available drafts: {list(app.config.get('DRAFTS', {}).keys())}")
 
-    draft = app.config.get('DRAFTS', {}).get(token)
-    if not draft:
-        print(f"❌ No draft found for token: {token}")
-        return jsonify({'status': 'error', 'message': 'Invalid booking token'}), 400
-    
-    if draft['order_id'] != order_id:
+    if not order_id:
+        return jsonify({'status': 'error', 'message': 'Order ID required'}), 400
+    with sqlite3.connect(DB_PATH) as con:
+        draft = load_draft(con, token)
+    if draft and draft['order_id'] != order_id:
         print(f"❌ Order ID mismatch: draft={draft['order_id']}, request={order_id}")
         return jsonify({'status': 'error', 'message': 'Order ID mismatch'}), 400
 
-    print(f"✅ Draft found: {draft}")
-
-    # verify signature (skip for test orders)
+    # verify signature (skip for test orders); nothing about this payment is looked up before it passes
+    verified = False
     if order_id.startswith('order_test_'):
         print(f"🧪 Test mode: Skipping signature verification for order {order_id}")
     elif rzp:
         try:
-            rzp.utility.verify_payment_signature({
-                'razorpay_order_id': order_id,
-                'razorpay_payment_id': payment_id,
-                'razorpay_signature': signature
-            })
+            verify_signature(order_id, payment_id, signature)
+            verified = True
             print(f"✅ Signature verification successful")
         except Exception as e:
             print(f"❌ Signature verification failed: {e}")
@@ -192,48 +353,62 @@ def verify_payment():
     else:
         print(f"⚠️  No Razorpay client available, skipping signature verification")
 
+    if verified:
+        with sqlite3.connect(DB_PATH) as con:
+            paid = con.execute('SELECT booking_id FROM bookings WHERE payment_id=?', (payment_id,)).fetchone()
+        if paid:
+            # a retried verification for a payment that is already booked
+            return jsonify({'status': 'ok', 'booking_id': paid[0]})
+    if not draft:
+        print(f"❌ No draft found for token: {token}")
+        if verified:
+            # genuinely paid but nothing to book against: keep it for a refund
+            with sqlite3.connect(DB_PATH) as con:
+                record_payment_issue(con, payment_id, order_id, token, 'no_draft')
+            return jsonify({'status': 'error', 'message': 'We received your payment but could not find your booking. '
+                                                          'Our team will contact you to refund or confirm it.'}), 409
+        return jsonify({'status': 'error', 'message': 'Invalid booking token'}), 400
+
+    print(f"✅ Draft found: {draft}")
+
     # Persist booking
     booking_id = f"B{secrets.token_hex(5).upper()}"
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
     try:
+        # confirms the hold (or re-checks capacity if it lapsed) in the same transaction as the insert
         with sqlite3.connect(DB_PATH) as con:
-            cur = con.cursor()
-            cur.execute('''INSERT INTO bookings (
-                booking_id, date, time, route, persons, children_under3, name, phone, email, address,
-                id_type, id_path, amount, payment_id, created_at
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''', (
-                booking_id, draft['date'], draft['time'], draft['route'], draft['persons'], draft['children_under3'],
-                draft['name'], draft['phone'], draft['email'], draft['address'],
-                draft['id_type'], draft['id_path'], draft['amount'], payment_id, now
-            ))
-            con.commit()
-        print(f"✅ Booking saved to database: {booking_id}")
+            # the booking is built from the draft as it stands inside the transaction (a reschedule may have moved it)
+            outcome, draft = confirm_booking(con, token, {'booking_id': booking_id, 'payment_id': payment_id,
+                                                          'created_at': now}, app.config['SLOT_CAPACITY'])
     except Exception as e:
         print(f"❌ Database error: {e}")
         return jsonify({'status': 'error', 'message': 'Database error'}), 500
+    if outcome == 'duplicate':
+        return jsonify({'status': 'error', 'message': 'This booking is already being processed'}), 409
+    if outcome == 'sold_out':
+        print(f"❌ Hold for {token} lapsed and the departure filled; payment {payment_id} recorded for refund")
+        return jsonify({'status': 'error', 'message': 'Your seat hold expired and this departure is now full. '
+                                                      'Your payment has been recorded and will be refunded.'}), 409
+    print(f"✅ Booking saved to database: {booking_id}")
 
     # Generate ticket
+    pdf_key = f"{booking_id}.pdf"
+    pdf_path = os.path.join(ticket_store.staging_dir, pdf_key)
     try:
-        tickets_dir = os.path.join(app.instance_path, 'tickets')
-        os.makedirs(tickets_dir, exist_ok=True)
-        pdf_path = os.path.join(tickets_dir, f"{booking_id}.pdf")
-        generate_ticket_pdf(pdf_path, {
-            'booking_id': booking_id, 'date': draft['date'], 'time': draft['time'], 'route': draft['route'],
-            'persons': draft['persons'], 'children_under3': draft['children_under3'],
-            'name': draft['name'], 'phone': draft['phone'], 'email': draft['email'],
-            'amount': draft['amount'], 'payment_id': payment_id
-        })
-        print(f"✅ PDF ticket generated: {pdf_path}")
+        render_ticket(pdf_path, ticket_data(draft))
+        ticket_store.put_file(pdf_key, pdf_path)
+        print(f"✅ PDF ticket generated: {ticket_store.location(pdf_key)}")
     except Exception as e:
         print(f"⚠️  PDF generation failed: {e}")
 
     # Email ticket (skip in test mode to avoid errors)
     try:
         if not order_id.startswith('order_test_'):
-            send_ticket(mail, draft['email'], subject=f"Boat Ticket {booking_id}",
-                        body=f"Dear {draft['name']},\n\nAttached is your boat ticket.\nBooking ID: {booking_id}\nDate/Time: {draft['date']} {draft['time']}\nRoute: {draft['route']}\nAmount: ₹{draft['amount']/100:.2f}\n\nThank you!",
-                        attachment_path=pdf_path)
+            with ticket_store.local_path(pdf_key) as pdf_path:
+                send_ticket(mail, draft['email'], subject=f"Boat Ticket {booking_id}",
+                            body=f"Dear {draft['name']},\n\nAttached is your boat ticket.\nBooking ID: {booking_id}\nDate/Time: {draft['date']} {draft['time']}\nRoute: {draft['route']}\nAmount: ₹{draft['amount']/100:.2f}\n\nThank you!",
+                            attachment_path=pdf_path)
             print(f"✅ Email sent to {draft['email']}")
         else:
             print(f"🧪 Test mode: Skipping email sending")
@@ -254,13 +429,29 @@ def verify_payment():
     except Exception as e:
         print(f"⚠️  Google Sheets append failed: {e}")
 
-    # cleanup draft
-    del app.config['DRAFTS'][token]
-    print(f"✅ Draft cleaned up for token: {token}")
-
     print(f"🎉 Payment verification successful! Booking ID: {booking_id}")
     return jsonify({'status': 'ok', 'booking_id': booking_id})
 
+@app.post('/waitlist')
+def waitlist_join():
+    data = request.get_json(silent=True) or request.form
+    fields = ['date', 'time', 'route', 'name', 'phone', 'email']
+    if not all(data.get(f) for f in fields):
+        return jsonify({'status': 'error', 'message': 'date, time, route, name, phone and email required'}), 400
+    persons = party_size(data.get('persons', 1))
+    if persons is None:
+        return jsonify({'status': 'error',
+                        'message': f"persons must be a whole number from 1 to {app.config['SLOT_CAPACITY']}"}), 400
+    with sqlite3.connect(DB_PATH) as con:
+        waitlist_id, position = join_waitlist(con, data['date'], data['time'], data['route'], persons,
+                                              data['name'], data['phone'], data['email'])
+        # seats may already be free (e.g. released before anyone queued)
+        offers = offer_free_seats(con, data['date'], data['time'], data['route'],
+                                  app.config['SLOT_CAPACITY'], app.config['WAITLIST_OFFER_SECONDS'])
+    notify_waitlist_offers(offers)
+    return jsonify({'status': 'ok', 'waitlist_id': waitlist_id, 'position': position,
+                    'offered': any(o['email'] == data['email'] for o in offers)})
+
 @app.get('/success')
 def success():
     booking_id = request.args.get('bid')
@@ -270,6 +461,10 @@ def success():
         cur = con.cursor()
         cur.execute('SELECT name, email FROM bookings WHERE booking_id=?', (booking_id,))
         row = cur.fetchone()
+        archived = not row and find_archived(con, booking_id)
+    if archived:
+        booking = load_archived_booking(archive_store, archived)
+        row = booking and (booking['name'], booking['email'])
     if not row:
         abort(404)
     name, email = row
@@ -277,10 +472,23 @@ def success():
 
 @app.get('/ticket/<booking_id>')
 def download_ticket(booking_id):
-    pdf_path = os.path.join(app.instance_path, 'tickets', f"{booking_id}.pdf")
-    if not os.path.exists(pdf_path):
+    key = f"{booking_id}.pdf"
+    with sqlite3.connect(DB_PATH) as con:
+        live = con.execute('SELECT 1 FROM bookings WHERE booking_id=?', (booking_id,)).fetchone()
+        archived = not live and find_archived(con, booking_id)
+    if live:
+        # with an object store, hand the client a presigned URL instead of streaming bytes here;
+        # the booking row stands in for an exists() check, which would cost a HEAD round trip
+        url = ticket_store.download_url(key, key)
+        if url:
+            return redirect(url)
+        with ticket_store.local_path(key) as pdf_path:
+            if pdf_path:  # send_file opens the file right away, so the path need not outlive this block
+                return send_file(pdf_path, as_attachment=True, download_name=key)
+    data = archived and read_archived_file(archive_store, archived['month'], ticket_member(booking_id))
+    if not data:
         abort(404)
-    return send_file(pdf_path, as_attachment=True, download_name=f"{booking_id}.pdf")
+    return send_file(BytesIO(data), mimetype='application/pdf', as_attachment=True, download_name=key)
 
 # --- Admin (simple Basic Auth) ---
 from functools import wraps
@@ -322,5 +530,142 @@ def admin_bookings():
         data = [dict(r) for r in rows]
     return jsonify({'bookings': data})
 
+@app.get('/admin/waitlist')
+@require_admin
+def admin_waitlist():
+    with sqlite3.connect(DB_PATH) as con:
+        con.row_factory = sqlite3.Row
+        rows = con.execute('''SELECT id, date, time, route, persons, name, phone, email, status, created_at
+                              FROM waitlist WHERE status IN ('waiting', 'offered') ORDER BY date, time, id''').fetchall()
+        data = [dict(r) for r in rows]
+    return jsonify({'waitlist': data})
+
+@app.get('/admin/payment_issues')
+@require_admin
+def admin_payment_issues():
+    # captured payments without a booking (hold lapsed on a full departure, or draft gone)
+    with sqlite3.connect(DB_PATH) as con:
+        con.row_factory = sqlite3.Row
+        rows = con.execute('''SELECT payment_id, order_id, reason, data, status, created_at
+                              FROM payment_issues WHERE status='open' ORDER BY created_at''').fetchall()
+        data = [dict(r) for r in rows]
+    for d in data:
+        d['draft'] = json.loads(d.pop('data') or 'null')
+    return jsonify({'payment_issues': data})
+
+@app.post('/admin/reschedule')
+@require_admin
+def admin_reschedule():
+    payload = request.get_json() or {}
+    if not all(payload.get(f) for f in ('date', 'time', 'route')):
+        return jsonify({'status': 'error', 'message': 'date, time and route required'}), 400
+    try:
+        with sqlite3.connect(DB_PATH) as con:
+            job_id, total, offers = create_job(con, payload['date'], payload['time'], payload['route'],
+                                               payload.get('new_date'), payload.get('new_time'),
+                                               payload.get('message', ''), app.config['SLOT_CAPACITY'],
+                                               app.config['WAITLIST_OFFER_SECONDS'])
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    start_reissue_job(job_id)
+    notify_waitlist_offers(offers)
+    return jsonify({'status': 'ok', 'job_id': job_id, 'total': total})
+
+@app.get('/admin/reschedule/<job_id>')
+@require_admin
+def admin_reschedule_status(job_id):
+    with sqlite3.connect(DB_PATH) as con:
+        job = get_job(con, job_id)
+    if not job:
+        abort(404)
+    return jsonify(job)
+
+@app.post('/admin/reschedule/<job_id>/resume')
+@require_admin
+def admin_reschedule_resume(job_id):
+    with sqlite3.connect(DB_PATH) as con:
+        if not get_job(con, job_id):
+            abort(404)
+    started = start_reissue_job(job_id)
+    return jsonify({'status': 'ok' if started else 'already running', 'job_id': job_id})
+
+@app.get('/admin/search')
+@require_admin
+def admin_search():
+    q = request.args.get('q', '')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 200))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'limit must be an integer'}), 400
+    with sqlite3.connect(DB_PATH) as con:
+        con.row_factory = sqlite3.Row
+        data = [dict(r) for r in search_bookings(con, q, limit)]
+    return jsonify({'bookings': data})
+
+@app.get('/boarding/manifest')
+@require_admin
+def boarding_manifest():
+    date, time, route = request.args.get('date'), request.args.get('time'), request.args.get('route')
+    if not all([date, time, route]):
+        return jsonify({'status': 'error', 'message': 'date, time and route required'}), 400
+    if not boarding_key:
+        return jsonify({'status': 'error', 'message': 'BOARDING_KEY is not configured'}), 503
+    with sqlite3.connect(DB_PATH) as con:
+        rows = con.execute('SELECT booking_id, persons, children_under3 FROM bookings WHERE date=? AND time=? AND route=?',
+                           (date, time, route)).fetchall()
+    data = build_manifest(boarding_key, date, time, route, rows)
+    return send_file(BytesIO(data), mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"manifest-{date}-{time.replace(':', '')}.bsm")
+
+@app.get('/boarding/key')
+@require_admin
+def boarding_public_key():
+    # scanners are provisioned with the public half only: they can verify tickets, not sign them
+    if not boarding_key:
+        return jsonify({'status': 'error', 'message': 'BOARDING_KEY is not configured'}), 503
+    return jsonify({'public_key': public_key_text(boarding_key)})
+
+@app.post('/boarding/checkins')
+@require_admin
+def boarding_checkins():
+    payload = request.get_json(silent=True)
+    checkins = payload.get('checkins') if isinstance(payload, dict) else None
+    if not isinstance(checkins, list) or not all(
+            isinstance(c, dict) and c.get('booking_id') and isinstance(c['booking_id'], str)
+            and all(isinstance(c.get(f), (str, type(None))) for f in ('scanned_at', 'device'))
+            for c in checkins):
+        return jsonify({'status': 'error',
+                        'message': 'checkins must be a list of objects with a string booking_id'}), 400
+    with sqlite3.connect(DB_PATH) as con:
+        added = record_checkins(con, checkins, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    return jsonify({'status': 'ok', 'received': len(checkins), 'recorded': added})
+
+@app.get('/admin/archive/<booking_id>')
+@require_admin
+def admin_archived_booking(booking_id):
+    with sqlite3.connect(DB_PATH) as con:
+        archived = find_archived(con, booking_id)
+    if not archived:
+        abort(404)
+    return jsonify({'booking': load_archived_booking(archive_store, archived) or archived})
+
+def run_archive(days=None):
+    days = app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    before = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    summary = archive_bookings(DB_PATH, archive_store, ticket_store, id_store, before)
+    print(f"📦 Archived {summary['bookings']} booking(s) and {summary['files']} file(s) dated before {before}")
+    return summary
+
+# Archiving runs from cron, not a request: it outlasts the worker timeout on a large backlog.
+@app.cli.command('archive-bookings')
+def archive_command():
+    """Move bookings older than ARCHIVE_AFTER_DAYS into the monthly archives."""
+    run_archive()
+
+@app.cli.command('boarding-key')
+def boarding_key_command():
+    """Print a new BOARDING_KEY (Ed25519 private key) for the environment."""
+    print(generate_signing_key())
+
 if __name__ == '__main__':
     app.run(debug=True)
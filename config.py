@@ -24,6 +24,37 @@ class Config:
 
     BASE_URL = os.getenv("BASE_URL", "http://127.0.0.1:5000")
 
+    # Seat inventory
+    SLOT_CAPACITY = int(os.getenv("SLOT_CAPACITY", 20))  # seats per departure (date/time/route)
+    CHECKOUT_HOLD_SECONDS = int(os.getenv("CHECKOUT_HOLD_SECONDS", 15 * 60))
+    WAITLIST_OFFER_SECONDS = int(os.getenv("WAITLIST_OFFER_SECONDS", 30 * 60))
+    HOLD_SWEEP_INTERVAL = int(os.getenv("HOLD_SWEEP_INTERVAL", 30))  # seconds; 0 disables the sweeper thread
+    DRAFT_RETENTION_SECONDS = int(os.getenv("DRAFT_RETENTION_SECONDS", 7 * 24 * 3600))  # lets late payments still match a checkout
+
+    # Bulk ticket re-issue
+    REISSUE_PROCESSES = int(os.getenv("REISSUE_PROCESSES", 0)) or None  # PDF render processes; default one per CPU
+    MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", 4))  # concurrent SMTP connections
+
+    # Bookings (with their tickets and ID proofs) older than this move to instance/archive
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 365))
+
+    # Ed25519 private key signing ticket QR payloads and boarding manifests (flask --app app boarding-key);
+    # scanners only get the public key. Unset: no QR codes and no manifests.
+    BOARDING_KEY = os.getenv("BOARDING_KEY")
+
+    # Ticket / ID proof storage: "local" (folders below) or "s3" (any S3-compatible store, e.g. MinIO; needs boto3)
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+    S3_BUCKET = os.getenv("S3_BUCKET")
+    S3_PREFIX = os.getenv("S3_PREFIX", "")
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://127.0.0.1:9000 for a local MinIO
+    S3_REGION = os.getenv("S3_REGION")
+    S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID")
+    S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY")
+    # presigned redirects move download bandwidth off the app; serving from the local cache is faster otherwise
+    STORAGE_REDIRECT_DOWNLOADS = os.getenv("STORAGE_REDIRECT_DOWNLOADS", "false").lower() == "true"
+    STORAGE_PRESIGN_SECONDS = int(os.getenv("STORAGE_PRESIGN_SECONDS", 300))
+    STORAGE_CACHE_MB = int(os.getenv("STORAGE_CACHE_MB", 256))  # local read-through cache for S3 objects, per worker process
+
     # Flask paths
     INSTANCE_PATH = os.path.join(os.getcwd(), 'instance')
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads', 'id_proofs')
@@ -0,0 +1,171 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import zipfile
+from itertools import groupby
+
+from services.search import optimize_search_index
+
+# Old bookings move out of the hot database into one gzip-compressed SQLite
+# image per month (bookings-YYYY-MM.db.gz), and their ticket PDFs / ID proofs
+# into a matching files-YYYY-MM.zip. Both go to the archive blob store
+# (instance/archive, or the bucket with STORAGE_BACKEND=s3). A slim
+# archive_index (booking_id -> month) stays in the hot DB so /success and
+# ticket downloads still resolve.
+INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS archive_index (
+    booking_id TEXT PRIMARY KEY,
+    month TEXT,
+    id_member TEXT
+) WITHOUT ROWID;
+'''
+
+
+def init_archive(con):
+    con.executescript(INDEX_SCHEMA)
+    con.commit()
+
+
+def ticket_member(booking_id):
+    return f"tickets/{booking_id}.pdf"
+
+
+def _month_db(month):
+    return f"bookings-{month}.db.gz"
+
+
+def _month_zip(month):
+    return f"files-{month}.zip"
+
+
+def _open_month(store, month, schema):
+    con = sqlite3.connect(':memory:')
+    with store.local_path(_month_db(month)) as path:
+        if path:
+            with gzip.open(path, 'rb') as f:
+                con.deserialize(f.read())
+        else:
+            con.execute(schema)
+    return con
+
+
+def _save_month(con, store, month):
+    con.execute('VACUUM')
+    key = _month_db(month)
+    tmp = os.path.join(store.staging_dir, key + '.tmp')
+    with gzip.open(tmp, 'wb', compresslevel=9) as f:
+        f.write(con.serialize())
+    store.put_file(key, tmp)
+
+
+def _pack_files(store, month, members):
+    """Add (member name, store, key) entries to the month's zip, skipping ones already packed."""
+    key = _month_zip(month)
+    tmp = os.path.join(store.staging_dir, key + '.tmp')
+    with store.local_path(key) as existing:
+        if existing:
+            shutil.copyfile(existing, tmp)
+    packed = []
+    with zipfile.ZipFile(tmp, 'a', zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+        have = set(zf.namelist())
+        for name, src_store, src_key in members:
+            with src_store.local_path(src_key) as src:
+                if src:
+                    if name not in have:
+                        zf.write(src, name)
+                    packed.append((src_store, src_key))
+    if packed:
+        store.put_file(key, tmp)
+    else:
+        os.remove(tmp)
+    return packed
+
+
+def _release_free_pages(con, pages=256):
+    """Shrink the file in small incremental_vacuum steps so live writers only wait briefly."""
+    if con.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:  # not INCREMENTAL: free pages are reused in place
+        return
+    while con.execute('PRAGMA freelist_count').fetchone()[0]:
+        con.executescript(f'PRAGMA incremental_vacuum({pages})')  # executescript steps it to completion
+
+
+def archive_bookings(db_path, archive_store, ticket_store, id_store, before_date):
+    """Move bookings dated before before_date (YYYY-MM-DD) into the monthly archives.
+
+    Archives are written before anything is deleted from the hot database, so an
+    interrupted run is safe to repeat. Returns a summary dict.
+    """
+    hot = sqlite3.connect(db_path)
+    hot.row_factory = sqlite3.Row
+    schema = hot.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='bookings'").fetchone()[0]
+    rows = hot.execute('SELECT * FROM bookings WHERE date < ? ORDER BY date', (before_date,)).fetchall()
+    summary = {'bookings': len(rows), 'months': [], 'files': 0}
+
+    for month, group in groupby(rows, key=lambda r: r['date'][:7]):
+        group = list(group)
+        cols = group[0].keys()
+        con = _open_month(archive_store, month, schema)
+        con.executemany(f"INSERT OR REPLACE INTO bookings ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                        [tuple(r) for r in group])
+        con.commit()
+        _save_month(con, archive_store, month)
+        con.close()
+
+        index, members = [], []
+        for r in group:
+            id_member = f"id_proofs/{os.path.basename(r['id_path'])}" if r['id_path'] else None
+            members.append((ticket_member(r['booking_id']), ticket_store, f"{r['booking_id']}.pdf"))
+            if id_member:
+                members.append((id_member, id_store, os.path.basename(r['id_path'])))
+            index.append((r['booking_id'], month, id_member))
+        packed = _pack_files(archive_store, month, members)
+
+        with hot:
+            hot.executemany('INSERT OR REPLACE INTO archive_index VALUES (?,?,?)', index)
+            hot.executemany('DELETE FROM bookings WHERE booking_id=?', [(r['booking_id'],) for r in group])
+        for store, key in packed:
+            store.delete(key)
+        summary['months'].append(month)
+        summary['files'] += len(packed)
+
+    if rows:
+        optimize_search_index(hot)
+        _release_free_pages(hot)
+        hot.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    hot.close()
+    return summary
+
+
+def find_archived(con, booking_id):
+    con.row_factory = sqlite3.Row
+    row = con.execute('SELECT * FROM archive_index WHERE booking_id=?', (booking_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def load_archived_booking(archive_store, entry):
+    """Full booking row for an archive_index entry, read from its month's archive."""
+    with archive_store.local_path(_month_db(entry['month'])) as path:
+        if not path:
+            return None
+        with gzip.open(path, 'rb') as f:
+            image = f.read()
+    con = sqlite3.connect(':memory:')
+    con.deserialize(image)
+    con.row_factory = sqlite3.Row
+    row = con.execute('SELECT * FROM bookings WHERE booking_id=?', (entry['booking_id'],)).fetchone()
+    con.close()
+    return dict(row) if row else None
+
+
+def read_archived_file(archive_store, month, member):
+    if not member:
+        return None
+    with archive_store.local_path(_month_zip(month)) as path:
+        if not path:
+            return None
+        with zipfile.ZipFile(path) as zf:
+            try:
+                return zf.read(member)
+            except KeyError:
+                return None
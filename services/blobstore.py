@@ -0,0 +1,242 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Where ticket PDFs and ID proofs live. Keys are flat file names within a
+# namespace ("tickets", "id_proofs"). The filesystem store keeps today's layout
+# (instance/tickets, uploads/id_proofs). The S3 store works against AWS or any
+# S3-compatible server (MinIO locally) and keeps a bounded local read-through
+# cache so ticket e-mails and repeat downloads don't refetch objects.
+#
+# local_path(key) is a context manager: the path it yields (None if the object
+# is missing) is only guaranteed to exist until the with-block exits.
+
+CHUNK = 8 * 1024 * 1024
+
+
+class FilesystemStore:
+    def __init__(self, root):
+        self.root = root
+        self.staging_dir = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, os.path.basename(key))
+
+    def put_file(self, key, src):
+        """Store a local file under key; src is consumed (moved into place)."""
+        dst = self._path(key)
+        if os.path.abspath(src) != os.path.abspath(dst):
+            os.replace(src, dst)
+
+    def location(self, key):
+        """Where the object lives, for recording alongside a booking."""
+        return self._path(key)
+
+    @contextmanager
+    def local_path(self, key):
+        path = self._path(key)
+        yield path if os.path.exists(path) else None
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def download_url(self, key, download_name):
+        return None  # served by the app
+
+
+class ReadThroughCache:
+    """Local copies of remote objects, least recently used first out past max_bytes.
+
+    Each process keeps its own LRU (key -> size), seeded from the directory at
+    start-up, so adding a file never rescans it; the budget therefore applies
+    per worker process. Files another worker added are adopted on first use and
+    files another worker evicted are dropped. Only pinned entries (a path handed
+    to a caller that is still using it) are skipped by eviction.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.pins = {}
+        self.total = 0
+        os.makedirs(root, exist_ok=True)
+        found = []
+        for entry in os.scandir(root):
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            found.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(found):
+            self.entries[name] = size
+            self.total += size
+        with self.lock:
+            self._evict()
+
+    def path(self, key):
+        return os.path.join(self.root, os.path.basename(key))
+
+    def checkout(self, key):
+        """Pin and return the cached path for key, or None on a miss. Pair with release()."""
+        name = os.path.basename(key)
+        path = self.path(key)
+        with self.lock:
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                self._forget(name)  # evicted by another worker
+                return None
+            if name not in self.entries:
+                self.entries[name] = size
+                self.total += size
+            self.entries.move_to_end(name)
+            self.pins[name] = self.pins.get(name, 0) + 1
+            self._evict()
+        return path
+
+    def release(self, key):
+        name = os.path.basename(key)
+        with self.lock:
+            if self.pins.get(name, 0) > 1:
+                self.pins[name] -= 1
+            else:
+                self.pins.pop(name, None)
+            self._evict()
+
+    def add(self, key, src, pin=False):
+        name = os.path.basename(key)
+        size = os.path.getsize(src)
+        path = self.path(key)
+        with self.lock:
+            os.replace(src, path)
+            self._forget(name)
+            self.entries[name] = size
+            self.total += size
+            if pin:
+                self.pins[name] = self.pins.get(name, 0) + 1
+            self._evict()
+        return path
+
+    def discard(self, key):
+        name = os.path.basename(key)
+        with self.lock:
+            self._forget(name)
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, name):
+        size = self.entries.pop(name, None)
+        if size is not None:
+            self.total -= size
+
+    def _evict(self):
+        if self.total <= self.max_bytes:
+            return
+        for name in list(self.entries):
+            if self.total <= self.max_bytes:
+                break
+            if name in self.pins:
+                continue
+            self._forget(name)
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+
+
+class S3Store:
+    def __init__(self, namespace, bucket, cache_dir, cache_bytes, endpoint_url=None, region=None,
+                 access_key=None, secret_key=None, prefix='', presign_seconds=300, redirect=True, cache=True):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 needs boto3: pip install boto3")
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region,
+                                   aws_access_key_id=access_key, aws_secret_access_key=secret_key)
+        # multipart kicks in above one chunk, so large uploads stream in 8MB parts
+        self.transfer = TransferConfig(multipart_threshold=CHUNK, multipart_chunksize=CHUNK)
+        self.bucket = bucket
+        self.prefix = f"{prefix.strip('/')}/{namespace}/" if prefix else f"{namespace}/"
+        self.presign_seconds = presign_seconds
+        self.redirect = redirect
+        # cache=False keeps no local copies at all (ID proofs are personal data)
+        self.cache = ReadThroughCache(os.path.join(cache_dir, namespace), cache_bytes) if cache else None
+        self.staging_dir = os.path.join(cache_dir, 'staging')
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    def _key(self, key):
+        return self.prefix + os.path.basename(key)
+
+    def put_file(self, key, src):
+        """Upload a local file under key; src is consumed (kept as the cached copy, or removed)."""
+        with open(src, 'rb') as f:
+            self.client.upload_fileobj(f, self.bucket, self._key(key), Config=self.transfer)
+        if self.cache:
+            self.cache.add(key, src)
+        else:
+            os.remove(src)
+
+    def location(self, key):
+        return f"s3://{self.bucket}/{self._key(key)}"
+
+    def _download(self, key):
+        fd, tmp = tempfile.mkstemp(dir=self.staging_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                self.client.download_fileobj(self.bucket, self._key(key), f, Config=self.transfer)
+        except self.client.exceptions.ClientError:
+            os.remove(tmp)
+            return None
+        return tmp
+
+    @contextmanager
+    def local_path(self, key):
+        path = self.cache and self.cache.checkout(key)
+        if not path:
+            tmp = self._download(key)
+            if not tmp or not self.cache:
+                try:
+                    yield tmp
+                finally:
+                    if tmp:
+                        os.remove(tmp)
+                return
+            path = self.cache.add(key, tmp, pin=True)
+        try:
+            yield path
+        finally:
+            self.cache.release(key)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        if self.cache:
+            self.cache.discard(key)
+
+    def download_url(self, key, download_name):
+        """Presigned GET so the client fetches bytes straight from the object store."""
+        if not self.redirect:
+            return None
+        return self.client.generate_presigned_url('get_object', ExpiresIn=self.presign_seconds, Params={
+            'Bucket': self.bucket, 'Key': self._key(key),
+            'ResponseContentDisposition': f'attachment; filename="{download_name}"'})
+
+
+def make_store(config, namespace, local_root, cache_dir, cache=True):
+    if config.get('STORAGE_BACKEND', 'local') == 's3':
+        return S3Store(namespace, config['S3_BUCKET'], cache_dir, config['STORAGE_CACHE_MB'] * 1024 * 1024,
+                       endpoint_url=config.get('S3_ENDPOINT_URL'), region=config.get('S3_REGION'),
+                       access_key=config.get('S3_ACCESS_KEY_ID'), secret_key=config.get('S3_SECRET_ACCESS_KEY'),
+                       prefix=config.get('S3_PREFIX') or '', presign_seconds=config['STORAGE_PRESIGN_SECONDS'],
+                       redirect=config['STORAGE_REDIRECT_DOWNLOADS'], cache=cache)
+    return FilesystemStore(local_root)
@@ -0,0 +1,213 @@
+import base64
+import hashlib
+import os
+import struct
+from io import BytesIO
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+from services.pdf_ticket import generate_ticket_pdf
+
+# QR payload printed on each ticket:  BT2|<booking_id>|<date>|<time>|<route hash>|<persons>|<sig>
+# sig is an Ed25519 signature over the fields before it. The server keeps the
+# private key (BOARDING_KEY); scanners get only the public key, so they can
+# reject forged or edited tickets offline but cannot mint new ones.
+#
+# Per-departure manifest (little-endian):
+#   header   '<4sBIIBBH16s'  magic, version, count, slots, date/time/route lengths, salt
+#   strings  date, time, route (utf-8)
+#   table    slots x '<8sBB'  salted booking hash, persons, children (open addressing)
+#   trailer  64-byte Ed25519 signature of everything above
+MAGIC = b'BSM1'
+VERSION = 2
+HEADER = struct.Struct('<4sBIIBBH16s')
+RECORD = struct.Struct('<8sBB')
+EMPTY = bytes(8)
+SIG_SIZE = 64
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def load_signing_key(text):
+    """BOARDING_KEY is the urlsafe base64 of a raw 32-byte Ed25519 private key."""
+    return Ed25519PrivateKey.from_private_bytes(_unb64(text))
+
+
+def generate_signing_key():
+    return _b64(os.urandom(32))
+
+
+def public_key_text(signing_key):
+    """What scanners are provisioned with."""
+    return _b64(signing_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw))
+
+
+def load_public_key(text):
+    return Ed25519PublicKey.from_public_bytes(_unb64(text))
+
+
+def route_hash(route):
+    return _b64(hashlib.blake2b(route.encode(), digest_size=6).digest())
+
+
+def ticket_payload(signing_key, booking):
+    b = booking
+    body = f"BT2|{b['booking_id']}|{b['date']}|{b['time']}|{route_hash(b['route'])}|{b['persons']}"
+    return f"{body}|{_b64(signing_key.sign(body.encode()))}"
+
+
+def draw_ticket_qr(canvas, payload, x, y, size):
+    """Draw the boarding QR onto a reportlab canvas."""
+    from reportlab.graphics.barcode.qr import QrCodeWidget
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.graphics import renderPDF
+
+    widget = QrCodeWidget(payload, barLevel='M')
+    x0, y0, x1, y1 = widget.getBounds()
+    drawing = Drawing(size, size, transform=[size / (x1 - x0), 0, 0, size / (y1 - y0), 0, 0])
+    drawing.add(widget)
+    renderPDF.draw(drawing, canvas, x, y)
+
+
+def stamp_ticket_qr(pdf_path, payload, size=96, margin=24):
+    """Overlay the boarding QR in the top-right corner of a rendered ticket's first page."""
+    from pypdf import PdfReader, PdfWriter
+    from reportlab.pdfgen.canvas import Canvas
+
+    reader = PdfReader(pdf_path)
+    page = reader.pages[0]
+    width, height = float(page.mediabox.width), float(page.mediabox.height)
+    buf = BytesIO()
+    canvas = Canvas(buf, pagesize=(width, height))
+    draw_ticket_qr(canvas, payload, width - size - margin, height - size - margin, size)
+    canvas.save()
+    page.merge_page(PdfReader(buf).pages[0])
+    writer = PdfWriter(clone_from=reader)
+    tmp = pdf_path + '.qr'
+    with open(tmp, 'wb') as f:
+        writer.write(f)
+    os.replace(tmp, pdf_path)
+
+
+def render_ticket(pdf_path, data):
+    """generate_ticket_pdf plus the boarding QR, when the data carries a signed payload."""
+    generate_ticket_pdf(pdf_path, data)
+    if data.get('qr_payload'):
+        stamp_ticket_qr(pdf_path, data['qr_payload'])
+
+
+def _slot_key(salt, booking_id):
+    return hashlib.blake2b(booking_id.encode(), key=salt, digest_size=8).digest()
+
+
+def build_manifest(signing_key, date, time, route, bookings):
+    """Pack (booking_id, persons, children_under3) rows for one departure into a signed manifest."""
+    slots = 16
+    while slots < len(bookings) * 2:
+        slots *= 2
+    salt = os.urandom(16)
+    table = bytearray(slots * RECORD.size)
+    mask = slots - 1
+    for booking_id, persons, children in bookings:
+        key = _slot_key(salt, booking_id)
+        i = int.from_bytes(key[:4], 'little') & mask
+        while table[i * RECORD.size:i * RECORD.size + 8] != EMPTY:
+            i = (i + 1) & mask
+        RECORD.pack_into(table, i * RECORD.size, key, min(persons, 255), min(children or 0, 255))
+    strings = [date.encode(), time.encode(), route.encode()]
+    body = (HEADER.pack(MAGIC, VERSION, len(bookings), slots, *map(len, strings), salt)
+            + b''.join(strings) + bytes(table))
+    return body + signing_key.sign(body)
+
+
+class Manifest:
+    """Scanner-side view of a manifest: constant-time ticket checks, no network."""
+
+    def __init__(self, public_key, data):
+        body, sig = data[:-SIG_SIZE], data[-SIG_SIZE:]
+        try:
+            public_key.verify(sig, body)
+        except InvalidSignature:
+            raise ValueError('manifest signature mismatch')
+        magic, version, self.count, self.slots, *lengths, self.salt = HEADER.unpack_from(body)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('unsupported manifest')
+        self.public_key = public_key
+        pos = HEADER.size
+        strings = []
+        for n in lengths:
+            strings.append(body[pos:pos + n].decode())
+            pos += n
+        self.date, self.time, self.route = strings
+        self.route_hash = route_hash(self.route)
+        self.table = memoryview(body)[pos:]
+        self.checked_in = {}
+
+    def lookup(self, booking_id):
+        key = _slot_key(self.salt, booking_id)
+        mask = self.slots - 1
+        i = int.from_bytes(key[:4], 'little') & mask
+        while True:
+            k, persons, children = RECORD.unpack_from(self.table, i * RECORD.size)
+            if k == key:
+                return persons, children
+            if k == EMPTY:
+                return None
+            i = (i + 1) & mask
+
+    def check_in(self, payload, scanned_at=None):
+        """Validate a scanned QR payload; returns (status, booking_id, (persons, children) or None).
+
+        status is one of 'ok', 'duplicate', 'invalid', 'wrong_departure', 'not_found'.
+        The head-count comes from the manifest, so staff can count the party at the gate.
+        """
+        body, _, sig = payload.rpartition('|')
+        parts = body.split('|')
+        if len(parts) != 6 or parts[0] != 'BT2':
+            return 'invalid', None, None
+        _, booking_id, date, time, rhash, persons = parts
+        try:
+            self.public_key.verify(_unb64(sig), body.encode())
+        except (InvalidSignature, ValueError):
+            return 'invalid', booking_id, None
+        if (date, time, rhash) != (self.date, self.time, self.route_hash):
+            return 'wrong_departure', booking_id, None
+        party = self.lookup(booking_id)
+        if party is None:
+            return 'not_found', booking_id, None
+        if booking_id in self.checked_in:
+            return 'duplicate', booking_id, party
+        self.checked_in[booking_id] = scanned_at
+        return 'ok', booking_id, party
+
+
+CHECKIN_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS checkins (
+    booking_id TEXT PRIMARY KEY,
+    scanned_at TEXT,
+    device TEXT,
+    synced_at TEXT
+);
+'''
+
+
+def init_boarding(con):
+    con.executescript(CHECKIN_SCHEMA)
+    con.commit()
+
+
+def record_checkins(con, checkins, synced_at):
+    """Store a batch uploaded by a scanner; the first scan of a booking wins."""
+    before = con.total_changes
+    con.executemany('INSERT OR IGNORE INTO checkins (booking_id, scanned_at, device, synced_at) VALUES (?,?,?,?)',
+                    [(c['booking_id'], c.get('scanned_at'), c.get('device'), synced_at) for c in checkins])
+    con.commit()
+    return con.total_changes - before
@@ -0,0 +1,254 @@
+import json
+import secrets
+import time as _time
+from datetime import datetime
+
+# Seat holds live in SQLite so every worker sees the same inventory. Expiry is
+# driven by the holds_expiry index: a sweep only touches rows that are due,
+# never the whole table.
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS holds (
+    token TEXT PRIMARY KEY,
+    date TEXT, time TEXT, route TEXT,
+    persons INTEGER,
+    kind TEXT,               -- 'checkout' or 'offer'
+    waitlist_id INTEGER,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS holds_expiry ON holds (expires_at);
+CREATE INDEX IF NOT EXISTS holds_slot ON holds (date, time, route);
+
+CREATE TABLE IF NOT EXISTS waitlist (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT, time TEXT, route TEXT,
+    persons INTEGER,
+    name TEXT, phone TEXT, email TEXT,
+    status TEXT DEFAULT 'waiting',   -- waiting, offered, claimed, expired
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS waitlist_slot ON waitlist (date, time, route, status, id);
+
+CREATE INDEX IF NOT EXISTS bookings_slot ON bookings (date, time, route);
+CREATE INDEX IF NOT EXISTS bookings_payment ON bookings (payment_id);
+
+-- checkout drafts outlive their hold, so a late payment can still be matched
+CREATE TABLE IF NOT EXISTS drafts (
+    token TEXT PRIMARY KEY,
+    order_id TEXT,
+    data TEXT,               -- JSON
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS drafts_created ON drafts (created_at);
+
+-- captured payments that did not become a booking; refund or book by hand
+CREATE TABLE IF NOT EXISTS payment_issues (
+    payment_id TEXT PRIMARY KEY,
+    order_id TEXT,
+    token TEXT,
+    reason TEXT,             -- sold_out, no_draft
+    data TEXT,               -- JSON draft, when there was one
+    status TEXT DEFAULT 'open',
+    created_at TEXT
+);
+'''
+
+BOOKING_COLUMNS = ['booking_id', 'date', 'time', 'route', 'persons', 'children_under3', 'name', 'phone', 'email',
+                   'address', 'id_type', 'id_path', 'amount', 'payment_id', 'created_at']
+
+
+def init_holds(con):
+    con.executescript(SCHEMA)
+    con.commit()
+
+
+def seats_taken(con, date, time, route, now=None):
+    now = _time.time() if now is None else now
+    booked = con.execute('SELECT coalesce(sum(persons), 0) FROM bookings WHERE date=? AND time=? AND route=?',
+                         (date, time, route)).fetchone()[0]
+    held = con.execute('SELECT coalesce(sum(persons), 0) FROM holds WHERE date=? AND time=? AND route=? AND expires_at > ?',
+                       (date, time, route, now)).fetchone()[0]
+    return booked + held
+
+
+def place_hold(con, token, date, time, route, persons, capacity, ttl, now=None):
+    """Reserve seats for a checkout. Returns False when the departure cannot fit the party."""
+    if persons < 1:
+        raise ValueError('a hold needs at least one seat')
+    now = _time.time() if now is None else now
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        if seats_taken(con, date, time, route, now) + persons > capacity:
+            con.rollback()
+            return False
+        con.execute('INSERT INTO holds (token, date, time, route, persons, kind, expires_at) VALUES (?,?,?,?,?,?,?)',
+                    (token, date, time, route, persons, 'checkout', now + ttl))
+        con.commit()
+        return True
+    except Exception:
+        con.rollback()
+        raise
+
+
+def claim_offer(con, offer_token, token, date, time, route, persons, ttl, now=None):
+    """Turn a live waitlist offer into a checkout hold under the new booking token."""
+    if persons < 1:
+        raise ValueError('a hold needs at least one seat')
+    now = _time.time() if now is None else now
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        row = con.execute('''SELECT waitlist_id FROM holds WHERE token=? AND kind='offer' AND expires_at > ?
+                             AND date=? AND time=? AND route=? AND persons >= ?''',
+                          (offer_token, now, date, time, route, persons)).fetchone()
+        if not row:
+            con.rollback()
+            return False
+        con.execute('UPDATE holds SET token=?, kind=?, persons=?, expires_at=? WHERE token=?',
+                    (token, 'checkout', persons, now + ttl, offer_token))
+        con.execute("UPDATE waitlist SET status='claimed' WHERE id=?", (row[0],))
+        con.commit()
+        return True
+    except Exception:
+        con.rollback()
+        raise
+
+
+def join_waitlist(con, date, time, route, persons, name, phone, email):
+    cur = con.execute('''INSERT INTO waitlist (date, time, route, persons, name, phone, email, created_at)
+                         VALUES (?,?,?,?,?,?,?,?)''',
+                      (date, time, route, persons, name, phone, email,
+                       datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    con.commit()
+    position = con.execute('''SELECT count(*) FROM waitlist WHERE date=? AND time=? AND route=?
+                              AND status='waiting' AND id <= ?''', (date, time, route, cur.lastrowid)).fetchone()[0]
+    return cur.lastrowid, position
+
+
+def offer_seats(con, date, time, route, capacity, ttl, now=None):
+    """Offer free seats on one departure to waitlisted parties, oldest first.
+
+    A party too large for the seats left is skipped rather than blocking the
+    smaller parties queued behind it. Returns the offers made.
+    """
+    now = _time.time() if now is None else now
+    free = capacity - seats_taken(con, date, time, route, now)
+    offers = []
+    if free <= 0:
+        return offers
+    waiting = con.execute('''SELECT id, persons, name, email FROM waitlist
+                             WHERE date=? AND time=? AND route=? AND status='waiting' ORDER BY id''',
+                          (date, time, route)).fetchall()
+    for wid, persons, name, email in waiting:
+        if persons > free:
+            continue
+        token = secrets.token_urlsafe(16)
+        con.execute('INSERT INTO holds (token, date, time, route, persons, kind, waitlist_id, expires_at) VALUES (?,?,?,?,?,?,?,?)',
+                    (token, date, time, route, persons, 'offer', wid, now + ttl))
+        con.execute("UPDATE waitlist SET status='offered' WHERE id=?", (wid,))
+        offers.append({'token': token, 'date': date, 'time': time, 'route': route,
+                       'persons': persons, 'name': name, 'email': email, 'expires_at': now + ttl})
+        free -= persons
+        if free <= 0:
+            break
+    return offers
+
+
+def offer_free_seats(con, date, time, route, capacity, ttl, now=None):
+    """offer_seats in its own write transaction, for callers outside a sweep."""
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        offers = offer_seats(con, date, time, route, capacity, ttl, now)
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return offers
+
+
+def sweep_expired(con, capacity, offer_ttl, draft_ttl, now=None):
+    """Drop holds that are due, re-offer the freed seats and prune old drafts.
+
+    A draft is kept for draft_ttl seconds, well past its hold, so a payment
+    that completes late is still matched in confirm_booking.
+    Returns (expired checkout tokens, new offers).
+    """
+    now = _time.time() if now is None else now
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        con.execute('DELETE FROM drafts WHERE created_at <= ?', (now - draft_ttl,))
+        due = con.execute('SELECT token, date, time, route, kind, waitlist_id FROM holds WHERE expires_at <= ?',
+                          (now,)).fetchall()
+        if not due:
+            con.commit()
+            return [], []
+        con.execute('DELETE FROM holds WHERE expires_at <= ?', (now,))
+        expired_offers = [(r[5],) for r in due if r[4] == 'offer']
+        con.executemany("UPDATE waitlist SET status='expired' WHERE id=?", expired_offers)
+        offers = []
+        for date, time, route in {(r[1], r[2], r[3]) for r in due}:
+            offers.extend(offer_seats(con, date, time, route, capacity, offer_ttl, now))
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return [r[0] for r in due if r[4] == 'checkout'], offers
+
+
+def save_draft(con, token, draft, now=None):
+    now = _time.time() if now is None else now
+    con.execute('INSERT OR REPLACE INTO drafts (token, order_id, data, created_at) VALUES (?,?,?,?)',
+                (token, draft['order_id'], json.dumps(draft), now))
+    con.commit()
+
+
+def load_draft(con, token):
+    row = con.execute('SELECT data FROM drafts WHERE token=?', (token,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _payment_issue(con, payment_id, order_id, token, reason, draft):
+    con.execute('''INSERT OR IGNORE INTO payment_issues (payment_id, order_id, token, reason, data, created_at)
+                   VALUES (?,?,?,?,?,?)''',
+                (payment_id, order_id, token, reason, json.dumps(draft) if draft else None,
+                 datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+
+def record_payment_issue(con, payment_id, order_id, token, reason, draft=None):
+    _payment_issue(con, payment_id, order_id, token, reason, draft)
+    con.commit()
+
+
+def confirm_booking(con, token, paid, capacity, now=None):
+    """Turn a paid checkout into a booking. Returns (outcome, booking).
+
+    outcome is 'booked', 'sold_out' or 'duplicate'. paid carries booking_id,
+    payment_id and created_at; the rest of the booking comes from the draft as
+    read inside the transaction, so a departure moved by a reschedule is booked
+    where it now is. Claiming the draft, checking the hold and inserting share
+    one write transaction, so a hold swept by any worker cannot be overbooked.
+    If the hold is gone the seats are re-checked against capacity; when they no
+    longer fit, the payment goes to payment_issues for refund or manual booking.
+    """
+    now = _time.time() if now is None else now
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        draft = load_draft(con, token)
+        if not draft:
+            con.rollback()
+            return 'duplicate', None  # another request already consumed it
+        booking = dict(draft, **paid)
+        con.execute('DELETE FROM drafts WHERE token=?', (token,))
+        held = con.execute("SELECT 1 FROM holds WHERE token=? AND kind='checkout' AND expires_at > ?",
+                           (token, now)).fetchone()
+        con.execute('DELETE FROM holds WHERE token=?', (token,))
+        if not held and seats_taken(con, booking['date'], booking['time'], booking['route'], now) \
+                + booking['persons'] > capacity:
+            _payment_issue(con, booking['payment_id'], draft['order_id'], token, 'sold_out', draft)
+            con.commit()
+            return 'sold_out', booking
+        con.execute(f"INSERT INTO bookings ({', '.join(BOOKING_COLUMNS)}) VALUES ({', '.join('?' * len(BOOKING_COLUMNS))})",
+                    [booking[c] for c in BOOKING_COLUMNS])
+        con.commit()
+        return 'booked', booking
+    except Exception:
+        con.rollback()
+        raise
@@ -0,0 +1,237 @@
+import multiprocessing
+import os
+import queue
+import secrets
+import sqlite3
+import threading
+import time as _time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from services.holds import seats_taken, offer_seats
+from services.boarding import render_ticket
+
+# A re-issue job is checkpointed per booking: ticket_done / mail_done flip to 1
+# as work completes, so a crashed or interrupted job resumes where it stopped
+# instead of re-rendering and re-mailing the whole departure. A running job
+# holds a lease in the database (renewed by a heartbeat), so only one worker
+# process runs it and a job orphaned by a dead worker can be resumed.
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS reissue_jobs (
+    job_id TEXT PRIMARY KEY,
+    date TEXT, time TEXT, route TEXT,
+    new_date TEXT, new_time TEXT,
+    message TEXT,
+    status TEXT,             -- pending, running, done, incomplete
+    created_at TEXT, updated_at TEXT,
+    lease_until REAL         -- while running: the owner's heartbeat deadline
+);
+CREATE TABLE IF NOT EXISTS reissue_items (
+    job_id TEXT, booking_id TEXT,
+    ticket_done INTEGER DEFAULT 0,
+    mail_done INTEGER DEFAULT 0,
+    error TEXT,
+    PRIMARY KEY (job_id, booking_id)
+);
+'''
+
+TICKET_FIELDS = ['booking_id', 'date', 'time', 'route', 'persons', 'children_under3',
+                 'name', 'phone', 'email', 'amount', 'payment_id']
+
+LEASE_SECONDS = 60
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def init_reissue(con):
+    con.executescript(SCHEMA)
+    if 'lease_until' not in [r[1] for r in con.execute('PRAGMA table_info(reissue_jobs)')]:
+        con.execute('ALTER TABLE reissue_jobs ADD COLUMN lease_until REAL')
+    con.commit()
+
+
+def _move_departure(con, date, time, route, new_date, new_time, capacity, offer_ttl):
+    """Move bookings, checkout holds and the waitlist of a departure; returns the waitlist offers made.
+
+    Runs inside the caller's write transaction. Raises ValueError when the new
+    departure cannot seat everyone moving onto it.
+    """
+    now = _time.time()
+    slot = (date, time, route)
+    moving = con.execute('SELECT coalesce(sum(persons), 0) FROM bookings WHERE date=? AND time=? AND route=?',
+                         slot).fetchone()[0]
+    moving += con.execute('''SELECT coalesce(sum(persons), 0) FROM holds WHERE date=? AND time=? AND route=?
+                             AND kind='checkout' AND expires_at > ?''', slot + (now,)).fetchone()[0]
+    free = capacity - seats_taken(con, new_date, new_time, route, now)
+    if moving > free:
+        raise ValueError(f"{new_date} {new_time} has {max(free, 0)} free seat(s); {moving} needed")
+    con.execute('UPDATE bookings SET date=?, time=? WHERE date=? AND time=? AND route=?',
+                (new_date, new_time) + slot)
+    # customers mid-checkout move with the departure, so their payment books the new one
+    con.execute("UPDATE holds SET date=?, time=? WHERE date=? AND time=? AND route=? AND kind='checkout'",
+                (new_date, new_time) + slot)
+    con.execute('''UPDATE drafts SET data=json_set(data, '$.date', ?, '$.time', ?)
+                   WHERE json_extract(data, '$.date')=? AND json_extract(data, '$.time')=?
+                   AND json_extract(data, '$.route')=?''', (new_date, new_time) + slot)
+    # open offers lapse (their links name the old departure); the parties rejoin the queue on the new one
+    con.execute("DELETE FROM holds WHERE date=? AND time=? AND route=? AND kind='offer'", slot)
+    con.execute('''UPDATE waitlist SET date=?, time=?, status='waiting'
+                   WHERE date=? AND time=? AND route=? AND status IN ('waiting', 'offered')''',
+                (new_date, new_time) + slot)
+    return offer_seats(con, new_date, new_time, route, capacity, offer_ttl, now)
+
+
+def create_job(con, date, time, route, new_date=None, new_time=None, message='', capacity=None, offer_ttl=None):
+    """Snapshot the bookings on a departure into a job, moving them if a new date/time is given.
+
+    Returns (job_id, bookings, waitlist offers made on the new departure).
+    Raises ValueError if the new departure does not have room.
+    """
+    job_id = f"J{secrets.token_hex(5).upper()}"
+    now = _now()
+    offers = []
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        ids = [r[0] for r in con.execute('SELECT booking_id FROM bookings WHERE date=? AND time=? AND route=?',
+                                         (date, time, route))]
+        if (new_date or date, new_time or time) != (date, time):
+            offers = _move_departure(con, date, time, route, new_date or date, new_time or time, capacity, offer_ttl)
+        con.execute('INSERT INTO reissue_jobs VALUES (?,?,?,?,?,?,?,?,?,?,?)',
+                    (job_id, date, time, route, new_date, new_time, message, 'pending', now, now, None))
+        con.executemany('INSERT INTO reissue_items (job_id, booking_id) VALUES (?,?)', [(job_id, b) for b in ids])
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return job_id, len(ids), offers
+
+
+def get_job(con, job_id):
+    con.row_factory = sqlite3.Row
+    job = con.execute('SELECT * FROM reissue_jobs WHERE job_id=?', (job_id,)).fetchone()
+    if not job:
+        return None
+    total, tickets, mails, errors = con.execute('''SELECT count(*), coalesce(sum(ticket_done), 0),
+        coalesce(sum(mail_done), 0), count(error) FROM reissue_items WHERE job_id=?''', (job_id,)).fetchone()
+    return dict(job, total=total, tickets_done=tickets, mails_done=mails, errors=errors,
+                running=job['status'] == 'running' and (job['lease_until'] or 0) > _time.time())
+
+
+def claim_job(db_path, job_id):
+    """Mark a job running for this process. False if another worker holds a live lease on it."""
+    now = _time.time()
+    with sqlite3.connect(db_path) as con:
+        cur = con.execute('''UPDATE reissue_jobs SET status='running', lease_until=?, updated_at=?
+                             WHERE job_id=? AND (status!='running' OR coalesce(lease_until, 0) < ?)''',
+                          (now + LEASE_SECONDS, _now(), job_id, now))
+    return cur.rowcount == 1
+
+
+def _pending(con, job_id, where):
+    con.row_factory = sqlite3.Row
+    return [dict(r) for r in con.execute(f'''
+        SELECT {', '.join('b.' + f for f in TICKET_FIELDS)}
+        FROM reissue_items i JOIN bookings b ON b.booking_id = i.booking_id
+        WHERE i.job_id=? AND {where}''', (job_id,))]
+
+
+def _checkpoint(db_path, job_id, column, results):
+    with sqlite3.connect(db_path) as con:
+        con.executemany(f'UPDATE reissue_items SET {column}=?, error=? WHERE job_id=? AND booking_id=?',
+                        [(0 if err else 1, err, job_id, bid) for bid, err in results])
+        con.execute('UPDATE reissue_jobs SET updated_at=? WHERE job_id=?', (_now(), job_id))
+
+
+def _render(pdf_path, data):
+    render_ticket(pdf_path, data)
+
+
+def regenerate_tickets(db_path, job_id, store, ticket_data, processes=None, checkpoint_every=100):
+    """Re-render every pending ticket in a process pool (PDF layout is CPU bound)."""
+    with sqlite3.connect(db_path) as con:
+        pending = _pending(con, job_id, 'i.ticket_done=0')
+    if not pending:
+        return
+    results = []
+    # forkserver: forking this (threaded) web worker directly could copy a lock mid-acquire
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('forkserver')) as pool:
+        futures = {pool.submit(_render, os.path.join(store.staging_dir, f"{b['booking_id']}.pdf"), ticket_data(b)): b['booking_id']
+                   for b in pending}
+        for fut in as_completed(futures):
+            bid = futures[fut]
+            err = fut.exception()
+            if not err:
+                try:
+                    store.put_file(f"{bid}.pdf", os.path.join(store.staging_dir, f"{bid}.pdf"))
+                except Exception as e:
+                    err = e
+            results.append((bid, str(err) if err else None))
+            if len(results) >= checkpoint_every:
+                _checkpoint(db_path, job_id, 'ticket_done', results)
+                results = []
+    _checkpoint(db_path, job_id, 'ticket_done', results)
+
+
+def send_notifications(db_path, job_id, store, connect, make_message, connections=4):
+    """Mail every re-issued ticket over a small pool of long-lived SMTP connections.
+
+    connect() must return a context manager whose value has send(message);
+    make_message(booking, pdf_path) builds the message for one booking. Each
+    send is checkpointed as soon as it returns, so a resumed job never re-mails.
+    """
+    with sqlite3.connect(db_path) as con:
+        pending = _pending(con, job_id, 'i.ticket_done=1 AND i.mail_done=0')
+    if not pending:
+        return
+    todo = queue.Queue()
+    for b in pending:
+        todo.put(b)
+
+    def worker():
+        try:
+            with connect() as conn:
+                while True:
+                    try:
+                        b = todo.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        with store.local_path(f"{b['booking_id']}.pdf") as pdf_path:
+                            conn.send(make_message(b, pdf_path))
+                        err = None
+                    except Exception as e:
+                        err = str(e)
+                    _checkpoint(db_path, job_id, 'mail_done', [(b['booking_id'], err)])
+        except Exception as e:
+            print(f"⚠️  Mailer connection failed: {e}")
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(connections, len(pending)))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def _heartbeat(db_path, job_id, stop):
+    while not stop.wait(LEASE_SECONDS / 3):
+        with sqlite3.connect(db_path) as con:
+            con.execute('UPDATE reissue_jobs SET lease_until=? WHERE job_id=?',
+                        (_time.time() + LEASE_SECONDS, job_id))
+
+
+def run_job(db_path, job_id, store, ticket_data, connect, make_message, processes=None, connections=4):
+    """Run a job claimed with claim_job, renewing its lease until it finishes."""
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(db_path, job_id, stop), daemon=True).start()
+    try:
+        regenerate_tickets(db_path, job_id, store, ticket_data, processes)
+        send_notifications(db_path, job_id, store, connect, make_message, connections)
+    finally:
+        stop.set()
+        with sqlite3.connect(db_path) as con:
+            left = con.execute('SELECT count(*) FROM reissue_items WHERE job_id=? AND mail_done=0',
+                               (job_id,)).fetchone()[0]
+            con.execute('UPDATE reissue_jobs SET status=?, lease_until=NULL, updated_at=? WHERE job_id=?',
+                        ('incomplete' if left else 'done', _now(), job_id))
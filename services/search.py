@@ -0,0 +1,94 @@
+import re
+
+# Full-text index over the searchable booking fields. Phones are stored as
+# digits only, both as entered and as the 10-digit local number, so
+# "+91 98765-43210", "9876543210" and "98765" all hit the same booking.
+SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS bookings_fts USING fts5(
+    booking_id UNINDEXED, name, phone, email, route,
+    tokenize = "unicode61 remove_diacritics 2",
+    prefix = '2 3 4'
+);
+
+CREATE TRIGGER IF NOT EXISTS bookings_fts_ai AFTER INSERT ON bookings BEGIN
+    INSERT INTO bookings_fts (rowid, booking_id, name, phone, email, route)
+    VALUES (new.rowid, new.booking_id, new.name, {phone}, new.email, new.route);
+END;
+
+CREATE TRIGGER IF NOT EXISTS bookings_fts_ad AFTER DELETE ON bookings BEGIN
+    DELETE FROM bookings_fts WHERE rowid = old.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS bookings_fts_au AFTER UPDATE ON bookings BEGIN
+    DELETE FROM bookings_fts WHERE rowid = old.rowid;
+    INSERT INTO bookings_fts (rowid, booking_id, name, phone, email, route)
+    VALUES (new.rowid, new.booking_id, new.name, {phone}, new.email, new.route);
+END;
+'''
+
+_PHONE_JUNK = ['+', '-', ' ', '(', ')', '.', '/']
+
+
+def _phone_sql(col):
+    """SQL expression producing '<digits> <last 10 digits>' for a phone column."""
+    expr = f"coalesce({col}, '')"
+    for ch in _PHONE_JUNK:
+        expr = f"replace({expr}, '{ch}', '')"
+    return f"({expr} || ' ' || substr({expr}, -10))"
+
+
+def normalize_phone(value):
+    digits = re.sub(r'\D', '', value or '')
+    return digits[-10:] if len(digits) > 10 else digits
+
+
+def init_search_index(con):
+    """Create the FTS table and triggers, backfilling rows indexed before they existed."""
+    con.executescript(SCHEMA.format(phone=_phone_sql('new.phone')))
+    indexed = con.execute('SELECT count(*) FROM bookings_fts').fetchone()[0]
+    total = con.execute('SELECT count(*) FROM bookings').fetchone()[0]
+    if indexed != total:
+        con.execute('DELETE FROM bookings_fts')
+        con.execute(f'''INSERT INTO bookings_fts (rowid, booking_id, name, phone, email, route)
+            SELECT rowid, booking_id, name, {_phone_sql('phone')}, email, route FROM bookings''')
+    con.commit()
+
+
+def optimize_search_index(con):
+    """Merge index segments; bulk deletes otherwise leave tombstones taking up space."""
+    con.execute("INSERT INTO bookings_fts (bookings_fts) VALUES ('optimize')")
+    con.commit()
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def build_match(query):
+    """Turn free text from the admin box into an FTS5 prefix query.
+
+    Phone-like input (mostly digits) is matched against the phone column only;
+    everything else is split on whitespace and every term must match as a prefix.
+    """
+    query = (query or '').strip()
+    if not query:
+        return None
+    digits = re.sub(r'\D', '', query)
+    if len(digits) >= 4 and len(digits) >= len(re.sub(r'[\s+\-().]', '', query)):
+        return f'phone : {_quote(normalize_phone(digits))}*'
+    terms = [t for t in query.split() if re.search(r'\w', t)]
+    if not terms:
+        return None
+    return ' AND '.join(f'{_quote(t)}*' for t in terms)
+
+
+def search_bookings(con, query, limit=50):
+    match = build_match(query)
+    if not match:
+        return []
+    return con.execute('''
+        SELECT b.booking_id, b.name, b.phone, b.email, b.date, b.time, b.route, b.persons, b.amount
+        FROM bookings_fts f JOIN bookings b ON b.rowid = f.rowid
+        WHERE bookings_fts MATCH ?
+        ORDER BY f.rowid DESC
+        LIMIT ?''', (match, limit)).fetchall()
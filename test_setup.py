@@ -20,6 +20,8 @@ def test_imports():
         'gspread',
         'google.auth',
         'reportlab',
+        'pypdf',
+        'cryptography',
         'flask_mail',
         'werkzeug'
     ]